@@ -2,19 +2,33 @@
 # Final Unified application for the main tournament and the seeding tournament.
 # Corrected score handling for Swiss format advance.
 
-from flask import Flask, render_template, request, jsonify
-import math
-import json
+from flask import Flask, Response, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 import os
 import copy
+import functools
+import heapq
+import itertools
+import operator
+import re
+import time
+import atexit
+import threading
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from bracket_logic import SEED_KEY, advance_round, go_back_round, rank_swiss_match, swiss_rank_key
 
 # Nadeo API Configuration (Official Trackmania API)
 NADEO_API_BASE = "https://api.trackmania.com"
 NADEO_CLIENT_ID = None  # Will be set via environment variable or config
 NADEO_CLIENT_SECRET = None  # Will be set via environment variable or config
 NADEO_ACCESS_TOKEN = None  # Will be obtained via OAuth2 flow
+NADEO_TOKEN_EXPIRES_AT = 0.0  # time.monotonic() after which the token is refreshed
+NADEO_TOKEN_LOCK = threading.RLock()  # Re-entrant: the 401 hook can fire inside the token request
 
 # Load Nadeo credentials
 def load_nadeo_credentials():
@@ -23,8 +37,8 @@ def load_nadeo_credentials():
     
     try:
         if os.path.exists('nadeo_config.json'):
-            with open('nadeo_config.json', 'r') as f:
-                config = json.load(f)
+            with open('nadeo_config.json', 'rb') as f:
+                config = orjson.loads(f.read())
                 NADEO_CLIENT_ID = config.get('nadeo_client_id')
                 NADEO_CLIENT_SECRET = config.get('nadeo_client_secret')
                 
@@ -48,189 +62,212 @@ NADEO_HEADERS = {
     'Content-Type': 'application/json'
 }
 
+# Concurrent lookups for batch player resolution (keep <= the session's pool_maxsize)
+NADEO_MAX_WORKERS = 8
+
+# Shared session so every Nadeo call reuses pooled keep-alive connections
+NADEO_SESSION = requests.Session()
+NADEO_SESSION.headers.update(NADEO_HEADERS)
+NADEO_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+))
+
+# Long-lived worker pool for batch lookups, so a batch never pays thread start-up
+NADEO_EXECUTOR = ThreadPoolExecutor(max_workers=NADEO_MAX_WORKERS, thread_name_prefix='nadeo')
+
+# In-process TTL cache for read-only Nadeo lookups (rankings and names change slowly)
+NADEO_CACHE_TTL_SECONDS = 300
+NADEO_CACHE_MAXSIZE = 256
+NADEO_CACHE_LOCK = threading.RLock()
+NADEO_CACHES = []
+
+# Account IDs are UUID-like: 20+ ASCII letters, digits and dashes
+NADEO_ID_RE = re.compile(r'[A-Za-z0-9-]{20,}')
+
+def is_nadeo_id(query):
+    """Whether a lookup query looks like a Nadeo account ID rather than a username"""
+    return NADEO_ID_RE.fullmatch(query) is not None
+
+def copy_lookup_result(result):
+    """Copy a cached player dict or list of player dicts so callers can't mutate the cache"""
+    if isinstance(result, list):
+        return [dict(p) if isinstance(p, dict) else p for p in result]
+    return dict(result) if isinstance(result, dict) else result
+
+class NadeoUnavailable(Exception):
+    """Raised by a Nadeo lookup that got no real answer from the API"""
+
+def nadeo_ttl_cache(key_func, fallback):
+    """
+    Cache a lookup's results per key_func(*args, **kwargs) for NADEO_CACHE_TTL_SECONDS
+    If the lookup raises, fallback(*args, **kwargs) supplies mock data instead; mocks
+    are never cached, so the next call tries the API again
+    """
+    def decorator(func):
+        cache = {}
+        NADEO_CACHES.append(cache)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            with NADEO_CACHE_LOCK:
+                entry = cache.get(key)
+                if entry and time.monotonic() < entry[0]:
+                    return copy_lookup_result(entry[1])
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                print(f"⚠️  {func.__name__} falling back to mock data: {e}")
+                return fallback(*args, **kwargs)
+            with NADEO_CACHE_LOCK:
+                if key not in cache and len(cache) >= NADEO_CACHE_MAXSIZE:
+                    cache.pop(next(iter(cache)))  # evict the oldest entry
+                cache[key] = (time.monotonic() + NADEO_CACHE_TTL_SECONDS, result)
+            return copy_lookup_result(result)
+        return wrapper
+    return decorator
+
+def clear_nadeo_caches():
+    with NADEO_CACHE_LOCK:
+        for cache in NADEO_CACHES:
+            cache.clear()
+
 # Nadeo API Functions
+# Keyed on the exact spelling: results echo the search term back as trackmania_name
+@nadeo_ttl_cache(lambda username_or_id: username_or_id, fallback=lambda username_or_id: create_mock_player(username_or_id))
 def get_nadeo_player_by_username(username_or_id):
     """
     Search for a Trackmania player by username or ID using the official Nadeo API
     Returns player data including ID, username, and rankings
+    Raises NadeoUnavailable when the API has no answer (mock player via the cache wrapper)
     """
-    try:
-        # Get access token
-        access_token = get_nadeo_access_token()
-        if not access_token:
-            print("No Nadeo access token available")
-            return create_mock_player(username_or_id)
-        
-        # First, try to get player directly by ID if it looks like an ID
-        if len(username_or_id) >= 20 and username_or_id.replace('-', '').isalnum():
-            print(f"🔍 Detected Trackmania ID format: {username_or_id}")
-            # This looks like a Trackmania ID, try direct lookup
-            player_url = f"{NADEO_API_BASE}/players/{username_or_id}"
-            headers = {**NADEO_HEADERS, 'Authorization': f'Bearer {access_token}'}
-            
-            print(f"🔗 Attempting direct ID lookup: {player_url}")
-            response = requests.get(player_url, headers=headers, timeout=10)
-            print(f"📡 ID lookup response: {response.status_code}")
-            
-            if response.status_code == 200:
-                player = response.json()
-                print(f"✅ ID lookup successful: {player}")
-                return {
-                    "trackmania_id": username_or_id,  # Use the original ID
-                    "trackmania_name": player.get("name") or player.get("displayName") or f"Player_{username_or_id[:8]}",
-                    "display_bracket_name": player.get("displayName") or player.get("name") or f"Player_{username_or_id[:8]}",
-                    "seed": None,
-                    "rank": player.get("rank"),
-                    "score": player.get("score"),
-                    "zone": player.get("zone")
-                }
-            else:
-                print(f"❌ ID lookup failed: {response.status_code} - {response.text}")
-        else:
-            print(f"🔍 Detected username format: {username_or_id}")
-        
-        # If not an ID or direct lookup failed, search by username
-        search_url = f"{NADEO_API_BASE}/players/search"
-        headers = {**NADEO_HEADERS, 'Authorization': f'Bearer {access_token}'}
-        params = {"search": username_or_id}
+    # Get access token
+    access_token = get_nadeo_access_token()
+    if not access_token:
+        raise NadeoUnavailable("No Nadeo access token available")
+    
+    # First, try to get player directly by ID if it looks like an ID
+    if is_nadeo_id(username_or_id):
+        print(f"🔍 Detected Trackmania ID format: {username_or_id}")
+        # This looks like a Trackmania ID, try direct lookup
+        player_url = f"{NADEO_API_BASE}/players/{username_or_id}"
         
-        print(f"🔍 Attempting username search: {search_url}")
-        response = requests.get(search_url, params=params, headers=headers, timeout=10)
-        print(f"📡 Username search response: {response.status_code}")
+        print(f"🔗 Attempting direct ID lookup: {player_url}")
+        response = NADEO_SESSION.get(player_url, timeout=10)
+        print(f"📡 ID lookup response: {response.status_code}")
         
         if response.status_code == 200:
-            data = response.json()
-            print(f"📊 Username search results: {data}")
-            if data and len(data) > 0:
-                # Return the first (most relevant) result
-                player = data[0]
-                print(f"✅ Username search successful: {player}")
-                return {
-                    "trackmania_id": player.get("id") or player.get("accountId") or f"nadeo-{username_or_id.lower()}",
-                    "trackmania_name": username_or_id,  # Use the original search term
-                    "display_bracket_name": player.get("displayName") or player.get("name") or username_or_id,
-                    "seed": None,  # Will be assigned based on ranking
-                    "rank": player.get("rank"),
-                    "score": player.get("score"),
-                    "zone": player.get("zone")
-                }
-        
-        # If player not found, create mock player
-        print(f"Player not found in Nadeo API, creating mock player: {username_or_id}")
-        return create_mock_player(username_or_id)
-        
-    except Exception as e:
-        print(f"Error fetching Nadeo player data: {e}")
-        return create_mock_player(username_or_id)
+            player = response.json()
+            print(f"✅ ID lookup successful: {player}")
+            return {
+                "trackmania_id": username_or_id,  # Use the original ID
+                "trackmania_name": player.get("name") or player.get("displayName") or f"Player_{username_or_id[:8]}",
+                "display_bracket_name": player.get("displayName") or player.get("name") or f"Player_{username_or_id[:8]}",
+                "seed": None,
+                "rank": player.get("rank"),
+                "score": player.get("score"),
+                "zone": player.get("zone")
+            }
+        else:
+            print(f"❌ ID lookup failed: {response.status_code} - {response.text}")
+    else:
+        print(f"🔍 Detected username format: {username_or_id}")
+    
+    # If not an ID or direct lookup failed, search by username
+    search_url = f"{NADEO_API_BASE}/players/search"
+    params = {"search": username_or_id}
+    
+    print(f"🔍 Attempting username search: {search_url}")
+    response = NADEO_SESSION.get(search_url, params=params, timeout=10)
+    print(f"📡 Username search response: {response.status_code}")
+    
+    if response.status_code == 200:
+        data = response.json()
+        print(f"📊 Username search results: {data}")
+        if data and len(data) > 0:
+            # Return the first (most relevant) result
+            player = data[0]
+            print(f"✅ Username search successful: {player}")
+            return {
+                "trackmania_id": player.get("id") or player.get("accountId") or f"nadeo-{username_or_id.lower()}",
+                "trackmania_name": username_or_id,  # Use the original search term
+                "display_bracket_name": player.get("displayName") or player.get("name") or username_or_id,
+                "seed": None,  # Will be assigned based on ranking
+                "rank": player.get("rank"),
+                "score": player.get("score"),
+                "zone": player.get("zone")
+            }
+    
+    raise NadeoUnavailable(f"Player not found in Nadeo API: {username_or_id}")
+
+def resolve_nadeo_players(usernames_or_ids):
+    """
+    Look up several players concurrently over the shared session
+    Results keep the order of the input list
+    """
+    # Fetch the token once up front instead of every worker queueing on the token lock
+    get_nadeo_access_token()
+    return list(NADEO_EXECUTOR.map(get_nadeo_player_by_username, usernames_or_ids))
+
+def nadeo_ranked_player(player, seed):
+    """Convert a rankings API entry to a tournament player, seeded by ranking position"""
+    return {
+        "trackmania_id": player.get("id"),
+        "trackmania_name": player.get("name"),
+        "display_bracket_name": player.get("name"),
+        "seed": seed,
+        "rank": player.get("rank"),
+        "score": player.get("score"),
+        "zone": player.get("zone")
+    }
 
+@nadeo_ttl_cache(lambda limit=100: limit, fallback=lambda limit=100: create_mock_rankings(limit))
 def get_nadeo_player_rankings(limit=100):
     """
     Get top Trackmania players by ranking
-    Useful for auto-seeding tournaments
+    Useful for auto-seeding tournaments; mock rankings via the cache wrapper if the API fails
     """
-    try:
-        rankings_url = f"{TRACKMANIA_API_BASE}/rankings/players"
-        params = {"limit": limit}
-        
-        response = requests.get(rankings_url, params=params, headers=TRACKMANIA_HEADERS, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            players = []
-            for i, player in enumerate(data):
-                players.append({
-                    "trackmania_id": player.get("id"),
-                    "trackmania_name": player.get("name"),
-                    "display_bracket_name": player.get("name"),
-                    "seed": i + 1,  # Rank-based seeding
-                    "rank": player.get("rank"),
-                    "score": player.get("score"),
-                    "zone": player.get("zone")
-                })
-            return players
-        # If API fails, return mock data for testing
-        print("API failed, returning mock rankings for testing")
-        mock_players = []
-        for i in range(min(limit, 32)):
-            mock_players.append({
-                "trackmania_id": f"tm-mock-{i+1}",
-                "trackmania_name": f"Mock Player {i+1}",
-                "display_bracket_name": f"Mock Player {i+1}",
-                "seed": i + 1,
-                "rank": i + 1,
-                "score": 1000 - i * 10,
-                "zone": "Mock Zone"
-            })
-        return mock_players
-        
-    except Exception as e:
-        print(f"Error fetching Trackmania rankings: {e}")
-        # Return mock data for testing
-        mock_players = []
-        for i in range(min(limit, 32)):
-            mock_players.append({
-                "trackmania_id": f"tm-mock-{i+1}",
-                "trackmania_name": f"Mock Player {i+1}",
-                "display_bracket_name": f"Mock Player {i+1}",
-                "seed": i + 1,
-                "rank": i + 1,
-                "score": 1000 - i * 10,
-                "zone": "Mock Zone"
-            })
-        return mock_players
+    rankings_url = f"{TRACKMANIA_API_BASE}/rankings/players"
+    params = {"limit": limit}
+    
+    response = NADEO_SESSION.get(rankings_url, params=params, timeout=10)
+    if response.status_code == 200:
+        return [nadeo_ranked_player(player, i + 1) for i, player in enumerate(response.json())]
+    raise NadeoUnavailable(f"Rankings request failed: {response.status_code}")
 
+@nadeo_ttl_cache(lambda query, limit=10: (query, limit), fallback=lambda query, limit=10: create_mock_search_results(query))
 def search_nadeo_players(query, limit=10):
     """
     Search for multiple Trackmania players by partial username
-    Returns list of matching players
+    Returns list of matching players; a mock match via the cache wrapper if the API fails
     """
-    try:
-        # Try direct player lookup first
-        player = get_trackmania_player_by_username(query)
-        if player:
-            return [player]
-        
-        # If direct lookup fails, try search API
-        search_url = f"{TRACKMANIA_API_BASE}/search/player"
-        params = {"search": query, "limit": limit}
-        
-        response = requests.get(search_url, params=params, headers=TRACKMANIA_HEADERS, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            players = []
-            for player in data:
-                players.append({
-                    "trackmania_id": player.get("id") or f"tm-{player.get('name', query).lower()}",
-                    "trackmania_name": player.get("name") or query,
-                    "display_bracket_name": player.get("name") or query,
-                    "seed": None,
-                    "rank": player.get("rank"),
-                    "score": player.get("score"),
-                    "zone": player.get("zone")
-                })
-            return players
-        # If all else fails, return mock player
-        print(f"Search failed, returning mock player: {query}")
-        return [{
-            "trackmania_id": f"tm-{query.lower()}",
-            "trackmania_name": query,
-            "display_bracket_name": query,
-            "seed": None,
-            "rank": None,
-            "score": None,
-            "zone": None
-        }]
-    except Exception as e:
-        print(f"Error searching Trackmania players: {e}")
-        # Return mock player for testing
-        return [{
-            "trackmania_id": f"tm-{query.lower()}",
-            "trackmania_name": query,
-            "display_bracket_name": query,
-            "seed": None,
-            "rank": None,
-            "score": None,
-            "zone": None
-        }]
+    # Try direct player lookup first
+    player = get_trackmania_player_by_username(query)
+    if player:
+        return [player]
+    
+    # If direct lookup fails, try search API
+    search_url = f"{TRACKMANIA_API_BASE}/search/player"
+    params = {"search": query, "limit": limit}
+    
+    response = NADEO_SESSION.get(search_url, params=params, timeout=10)
+    if response.status_code == 200:
+        data = response.json()
+        players = []
+        for player in data:
+            players.append({
+                "trackmania_id": player.get("id") or f"tm-{player.get('name', query).lower()}",
+                "trackmania_name": player.get("name") or query,
+                "display_bracket_name": player.get("name") or query,
+                "seed": None,
+                "rank": player.get("rank"),
+                "score": player.get("score"),
+                "zone": player.get("zone")
+            })
+        return players
+    raise NadeoUnavailable(f"Search request failed: {response.status_code}")
 
 # New Nadeo API Functions
 def get_nadeo_access_token():
@@ -238,42 +275,61 @@ def get_nadeo_access_token():
     Get Nadeo API access token via OAuth2 flow
     This is required for all Nadeo API calls
     """
-    global NADEO_ACCESS_TOKEN
+    global NADEO_ACCESS_TOKEN, NADEO_TOKEN_EXPIRES_AT
     
-    if NADEO_ACCESS_TOKEN:
-        return NADEO_ACCESS_TOKEN
-    
-    try:
-        # OAuth2 token endpoint
-        token_url = "https://api.trackmania.com/oauth/access_token"
-        
-        # Client credentials flow (for server-to-server)
-        data = {
-            'grant_type': 'client_credentials',
-            'client_id': NADEO_CLIENT_ID,
-            'client_secret': NADEO_CLIENT_SECRET
-        }
-        
-        response = requests.post(token_url, data=data, headers=NADEO_HEADERS, timeout=10)
-        
-        if response.status_code == 200:
-            token_data = response.json()
-            NADEO_ACCESS_TOKEN = token_data.get('access_token')
+    # The lock keeps concurrent lookups from all requesting a fresh token at once
+    with NADEO_TOKEN_LOCK:
+        if NADEO_ACCESS_TOKEN and time.monotonic() < NADEO_TOKEN_EXPIRES_AT:
             return NADEO_ACCESS_TOKEN
-        else:
-            print(f"Failed to get Nadeo access token: {response.status_code}")
-            return None
+        
+        try:
+            # OAuth2 token endpoint
+            token_url = "https://api.trackmania.com/oauth/access_token"
             
-    except Exception as e:
-        print(f"Error getting Nadeo access token: {e}")
-        return None
+            # Client credentials flow (for server-to-server)
+            data = {
+                'grant_type': 'client_credentials',
+                'client_id': NADEO_CLIENT_ID,
+                'client_secret': NADEO_CLIENT_SECRET
+            }
+            
+            response = NADEO_SESSION.post(token_url, data=data, timeout=10)
+            
+            if response.status_code == 200:
+                token_data = response.json()
+                NADEO_ACCESS_TOKEN = token_data.get('access_token')
+                # Refresh a minute before Nadeo expires the token
+                NADEO_TOKEN_EXPIRES_AT = time.monotonic() + token_data.get('expires_in', 3600) - 60
+                # Authorize every later call made through the shared session
+                NADEO_SESSION.headers['Authorization'] = f'Bearer {NADEO_ACCESS_TOKEN}'
+                return NADEO_ACCESS_TOKEN
+            else:
+                print(f"Failed to get Nadeo access token: {response.status_code}")
+                return None
+                
+        except Exception as e:
+            print(f"Error getting Nadeo access token: {e}")
+            return None
+
+def expire_nadeo_token_on_401(response, *args, **kwargs):
+    """Session response hook: a 401 means the cached token was revoked, so fetch a new one next call"""
+    global NADEO_TOKEN_EXPIRES_AT
+    if response.status_code == 401:
+        with NADEO_TOKEN_LOCK:
+            # Only when the rejected token is still the current one: a late 401 for a
+            # token another thread already replaced must not drop the fresh one
+            if NADEO_ACCESS_TOKEN and response.request.headers.get('Authorization') == f'Bearer {NADEO_ACCESS_TOKEN}':
+                NADEO_TOKEN_EXPIRES_AT = 0.0
+                NADEO_SESSION.headers.pop('Authorization', None)
+
+NADEO_SESSION.hooks['response'].append(expire_nadeo_token_on_401)
 
 def create_mock_player(username_or_id):
     """Create a mock player for testing when API is unavailable"""
     print(f"🔄 Creating mock player for: {username_or_id}")
     
     # If it looks like a Trackmania ID, use it as the ID and generate a username
-    if len(username_or_id) >= 20 and username_or_id.replace('-', '').isalnum():
+    if is_nadeo_id(username_or_id):
         # This is likely a Trackmania ID
         print(f"🆔 Creating mock player from ID: {username_or_id}")
         return {
@@ -298,12 +354,24 @@ def create_mock_player(username_or_id):
             "zone": None
         }
 
+def create_mock_search_results(query):
+    """Create a mock search result for testing when API is unavailable"""
+    return [{
+        "trackmania_id": f"tm-{query.lower()}",
+        "trackmania_name": query,
+        "display_bracket_name": query,
+        "seed": None,
+        "rank": None,
+        "score": None,
+        "zone": None
+    }]
+
 def create_mock_rankings(limit):
     """Create mock rankings for testing when API is unavailable"""
     mock_players = []
     for i in range(min(limit, 32)):
         mock_players.append({
-            "trackmania_id": f"nadeo-mock-{i+1}",
+            "trackmania_id": f"tm-mock-{i+1}",
             "trackmania_name": f"Mock Player {i+1}",
             "display_bracket_name": f"Mock Player {i+1}",
             "seed": i + 1,
@@ -313,25 +381,39 @@ def create_mock_rankings(limit):
         })
     return mock_players
 
+def ranking_key(player):
+    """Order by Trackmania rank (lower rank = higher skill); unranked players go last"""
+    rank = player.get('rank')
+    return (rank is None, 0 if rank is None else rank)
+
 def auto_seed_players_by_ranking(players):
     """
     Auto-seed players based on their Trackmania ranking
     Higher ranked players get lower seed numbers
     """
     try:
-        # Sort players by rank (lower rank = higher skill = lower seed)
-        sorted_players = sorted(players, key=lambda p: p.get('rank', 999999))
+        sorted_players = sorted(players, key=ranking_key)
         
         # Assign seeds based on ranking
-        for i, player in enumerate(sorted_players):
-            player['seed'] = i + 1
+        for seed, player in enumerate(sorted_players, start=1):
+            player['seed'] = seed
         
         return sorted_players
     except Exception as e:
         print(f"Error auto-seeding players: {e}")
         return players
 
+class OrjsonProvider(DefaultJSONProvider):
+    """Serve jsonify() and request.get_json() through orjson instead of stdlib json"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 CONFIG_FILE = 'config.json'
 SEEDING_CONFIG_FILE = 'seeding_config.json'
@@ -341,20 +423,41 @@ load_nadeo_credentials()
 
 # --- Configuration Management ---
 
+# mtime of each config file as of our last read or write, used to spot outside edits
+_last_mtime = {}
+
 def load_config(file, default_structure):
-    if os.path.exists(file):
-        with open(file, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                pass 
-    with open(file, 'w') as f:
-        json.dump(default_structure, f, indent=4)
-    return default_structure
+    # Only called at startup: requests read the in-memory db through get_db,
+    # which re-parses a file only after its mtime changes
+    try:
+        with open(file, 'rb') as f:
+            data = orjson.loads(f.read())
+            # mtime of the handle we read, not a second lookup that could see a newer file
+            _last_mtime[file] = os.fstat(f.fileno()).st_mtime
+            return data
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        pass
+    save_config(file, default_structure)
+    return copy.deepcopy(default_structure)
+
+def config_bytes(data):
+    # Top-level keys starting with '_' are runtime-only and never persisted
+    payload = {k: v for k, v in data.items() if not k.startswith('_')}
+    return orjson.dumps(payload, option=orjson.OPT_INDENT_2)
 
 def save_config(file, data):
-    with open(file, 'w') as f:
-        json.dump(data, f, indent=4)
+    write_config(file, config_bytes(data))
+
+def write_config(file, content):
+    # Write the serialized config in one call to a sibling file and swap that
+    # in so a crash never leaves a torn config
+    tmp_file = f"{file}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, file)
+    _last_mtime[file] = os.stat(file).st_mtime
 
 # --- In-memory database ---
 db = {
@@ -401,27 +504,147 @@ db['seeding_tournament'] = load_config(SEEDING_CONFIG_FILE, default_seeding_conf
 db['seeding_tournament']['is_started'] = False
 
 
+# --- Background Config Writer ---
+# Endpoints only mark a config as dirty; the writer thread coalesces bursts of
+# edits into a single save so requests never wait on disk I/O.
+SAVE_DEBOUNCE_SECONDS = 0.25
+SAVE_RETRY_SECONDS = 2
+DB_FILES = {'main': (CONFIG_FILE, 'main_tournament'), 'seeding': (SEEDING_CONFIG_FILE, 'seeding_tournament')}
+_dirty = {'main': False, 'seeding': False}
+_save_event = threading.Event()
+_save_lock = threading.Lock()
+# Held by every route that mutates db (see locks_db), while a config is
+# serialized or reloaded, and by the status readers while they serialize, so a
+# response never mixes halves of two edits. When both locks are needed,
+# _save_lock is taken first.
+DB_LOCK = threading.RLock()
+
+# State versions back the /api/status ETag. Seeded from the clock so they keep
+# increasing across restarts.
+_version_counter = itertools.count(int(time.time() * 1000))
+_versions = {'main': next(_version_counter), 'seeding': next(_version_counter)}
+
+def bump_version(key):
+    _versions[key] = next(_version_counter)
+
+def locks_db(key):
+    """Run the view under DB_LOCK and bump the key's version however it exits,
+    so an early 400 after a partial edit still invalidates cached status"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pick up outside edits to the config before changing it; called
+            # before DB_LOCK since get_db takes _save_lock first
+            get_db(key)
+            with DB_LOCK:
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    bump_version(key)
+        return wrapper
+    return decorator
+
+def mark_dirty(key):
+    _dirty[key] = True
+    _save_event.set()
+
+def flush_dirty():
+    """Write every dirty config; returns False if any write failed (those stay dirty)"""
+    ok = True
+    with _save_lock:
+        for key, (file, db_key) in DB_FILES.items():
+            if _dirty[key]:
+                # Cleared before the snapshot so an edit made during the write marks it again
+                _dirty[key] = False
+                try:
+                    # Snapshot under the db lock, but keep the disk write outside it
+                    with DB_LOCK:
+                        content = config_bytes(db[db_key])
+                    write_config(file, content)
+                except Exception as e:
+                    _dirty[key] = True
+                    ok = False
+                    print(f"❌ Error saving {file}: {e}")
+    return ok
+
+def config_writer():
+    while True:
+        _save_event.wait()
+        time.sleep(SAVE_DEBOUNCE_SECONDS)
+        _save_event.clear()
+        if not flush_dirty():
+            # Retry the failed configs later instead of dropping the edit
+            time.sleep(SAVE_RETRY_SECONDS)
+            _save_event.set()
+
+threading.Thread(target=config_writer, daemon=True).start()
+atexit.register(flush_dirty)
+
+# --- Config Reloading ---
+def config_changed_on_disk(key):
+    file, _ = DB_FILES[key]
+    try:
+        return os.stat(file).st_mtime != _last_mtime.get(file) and not _dirty[key]
+    except OSError:
+        return False
+
+def get_db(key):
+    """
+    Return the in-memory state for 'main' or 'seeding'
+    Reloads it first if the config file was edited outside the app since our
+    last read/write. Routes that mutate call it first too (see locks_db), but a
+    change still waiting for the background writer always wins over the file:
+    an outside edit made in that window is overwritten by the pending save
+    """
+    file, db_key = DB_FILES[key]
+    # Check without the lock first so polls never wait behind a save in progress;
+    # re-check under it since the writer may be between os.replace and recording the mtime
+    if config_changed_on_disk(key):
+        with _save_lock:
+            if config_changed_on_disk(key):
+                try:
+                    with open(file, 'rb') as f:
+                        # Recorded before parsing so an invalid file is skipped until it changes again
+                        _last_mtime[file] = os.fstat(f.fileno()).st_mtime
+                        data = orjson.loads(f.read())
+                    with DB_LOCK:
+                        db[db_key] = data
+                        bump_version(key)
+                        if key == 'main':
+                            rebuild_bracket_cache()
+                    print(f"🔄 Reloaded {file} after external edit")
+                except (OSError, orjson.JSONDecodeError) as e:
+                    print(f"⚠️  Ignoring invalid {file}: {e}")
+    return db[db_key]
+
+
 # --- Helper Functions ---
 
+# Placeholder for bracket slots that are not decided yet; copy it, never mutate it
+TBD_PLAYER = {"trackmania_id": "TBD", "trackmania_name": "TBD", "display_bracket_name": "TBD", "seed": None, "score": 0}
+# trackmania_id values of slots that do not hold a real player
+PLACEHOLDER_IDS = frozenset({None, "TBD", "BYE"})
+SCORE_KEY = operator.itemgetter('score')
+
 def create_serpentine_matches(players):
     num_players = len(players)
     if num_players == 0: return []
-    num_matches = math.ceil(num_players / 4.0)
-    padded_players = players + [{"trackmania_id": "BYE", "trackmania_name": "BYE", "display_bracket_name": "BYE", "seed": None}] * (int(num_matches) * 4 - num_players)
+    num_matches = -(-num_players // 4)
+    padded_players = players + [{"trackmania_id": "BYE", "trackmania_name": "BYE", "display_bracket_name": "BYE", "seed": None}] * (num_matches * 4 - num_players)
     matches = []
-    for i in range(int(num_matches)):
+    for i in range(num_matches):
         match_players = [
             padded_players[i],
-            padded_players[int(num_matches) * 2 - 1 - i],
-            padded_players[int(num_matches) * 2 + i],
-            padded_players[int(num_matches) * 4 - 1 - i]
+            padded_players[num_matches * 2 - 1 - i],
+            padded_players[num_matches * 2 + i],
+            padded_players[num_matches * 4 - 1 - i]
         ]
         matches.append([p for p in match_players if p['trackmania_id'] != "BYE"])
     return matches
 
 def generate_double_elim_bracket(players):
     if not players: return None
-    sorted_players = sorted(players, key=lambda p: p['seed'])
+    sorted_players = sorted(players, key=SEED_KEY)
     bracket = {"upper": {"rounds": []}, "lower": {"rounds": []}, "grand_final": None}
     current_players = sorted_players
     round_num = 1
@@ -433,66 +656,111 @@ def generate_double_elim_bracket(players):
         bracket["upper"]["rounds"].append({"name": f"Upper Round {round_num}", "matches": matches})
         num_winners = len(matches) * 2
         if num_winners <= 2: break
-        current_players = [{"trackmania_id": "TBD", "trackmania_name": "TBD", "display_bracket_name": "TBD", "seed": None}] * num_winners
+        current_players = [TBD_PLAYER] * num_winners
         round_num += 1
     num_ub_rounds = len(bracket["upper"]["rounds"])
     for i in range(num_ub_rounds + 1):
         num_matches = len(bracket["upper"]["rounds"][i]["matches"]) if i < num_ub_rounds else 1
-        num_lb_matches = math.ceil(num_matches / 2.0)
+        num_lb_matches = -(-num_matches // 2)
         if num_lb_matches > 0:
-            bracket["lower"]["rounds"].append({"name": f"Lower Round {i+1}", "matches": [{"id": f"LB-R{i+1}M{j+1}", "players": [{"trackmania_id": "TBD", "trackmania_name": "TBD", "display_bracket_name": "TBD", "seed": None, "score": 0} for _ in range(4)], "winners": [], "is_complete": False} for j in range(int(num_lb_matches))]})
-    bracket["grand_final"] = {"name": "Grand Final", "matches": [{"id": "GF-M1", "players": [{"trackmania_id": "TBD", "trackmania_name": "TBD", "display_bracket_name": "TBD", "seed": None, "score": 0} for _ in range(4)], "winners": [], "is_complete": False}]}
+            bracket["lower"]["rounds"].append({"name": f"Lower Round {i+1}", "matches": [{"id": f"LB-R{i+1}M{j+1}", "players": [TBD_PLAYER.copy() for _ in range(4)], "winners": [], "is_complete": False} for j in range(num_lb_matches)]})
+    bracket["grand_final"] = {"name": "Grand Final", "matches": [{"id": "GF-M1", "players": [TBD_PLAYER.copy() for _ in range(4)], "winners": [], "is_complete": False}]}
     return bracket
 
+# Seeds that meet in each of the four Swiss round 1 matches
+SWISS_SEED_GROUPS = (range(1, 5), range(5, 9), range(9, 13), range(13, 17))
+
+def swiss_player(p):
+    """Copy a player into the Swiss bracket; every Swiss player has score and is_winner from here on"""
+    return {"trackmania_id": p["trackmania_id"], "trackmania_name": p["trackmania_name"], "display_bracket_name": p["display_bracket_name"], "seed": p["seed"], "score": 0, "is_winner": False}
+
 def generate_swiss_bracket(players):
     if len(players) != 16: return None
-    sorted_players = sorted(players, key=lambda p: p['seed'])
+    by_seed = {p['seed']: p for p in players}
+    # Seeds must be exactly 1-16 so every match gets 4 players
+    if by_seed.keys() != set(range(1, 17)): return None
     matches = [
-        {"id": "SWISS-R1-M1", "name": "Match 1", "players": [{"trackmania_id": p["trackmania_id"], "trackmania_name": p["trackmania_name"], "display_bracket_name": p["display_bracket_name"], "seed": p["seed"], "score": 0, "is_winner": False} for p in sorted_players if p['seed'] in [1,2,3,4]], "is_complete": False},
-        {"id": "SWISS-R1-M2", "name": "Match 2", "players": [{"trackmania_id": p["trackmania_id"], "trackmania_name": p["trackmania_name"], "display_bracket_name": p["display_bracket_name"], "seed": p["seed"], "score": 0, "is_winner": False} for p in sorted_players if p['seed'] in [5,6,7,8]], "is_complete": False},
-        {"id": "SWISS-R1-M3", "name": "Match 3", "players": [{"trackmania_id": p["trackmania_id"], "trackmania_name": p["trackmania_name"], "display_bracket_name": p["display_bracket_name"], "seed": p["seed"], "score": 0, "is_winner": False} for p in sorted_players if p['seed'] in [9,10,11,12]], "is_complete": False},
-        {"id": "SWISS-R1-M4", "name": "Match 4", "players": [{"trackmania_id": p["trackmania_id"], "trackmania_name": p["trackmania_name"], "display_bracket_name": p["display_bracket_name"], "seed": p["seed"], "score": 0, "is_winner": False} for p in sorted_players if p['seed'] in [13,14,15,16]], "is_complete": False}
+        {"id": f"SWISS-R1-M{i+1}", "name": f"Match {i+1}", "players": [swiss_player(by_seed[s]) for s in seeds], "is_complete": False}
+        for i, seeds in enumerate(SWISS_SEED_GROUPS)
     ]
-    return {"stage": "seeding", "matches": matches, "history": {}, "round": 1}
+    # Player identities for expanding the compact round history, keyed by str(seed)
+    # since seeds are unique in a Swiss bracket and JSON object keys are strings
+    players_by_seed = {str(p["seed"]): {k: p[k] for k in ("trackmania_id", "trackmania_name", "display_bracket_name", "seed")} for m in matches for p in m["players"]}
+    return {"stage": "seeding", "matches": matches, "history": {}, "players_by_seed": players_by_seed, "round": 1}
+
+# --- Bracket Lookup Caches ---
+# Derived from db['main_tournament']['bracket'] and kept out of the JSON state;
+# rebuild whenever matches are replaced.
+bracket_cache = {"match_index": {}, "routing": {}}
+
+def iter_bracket_matches(bracket):
+    if not bracket: return
+    if 'matches' in bracket:
+        yield from bracket['matches']
+        return
+    for bracket_type in ('upper', 'lower'):
+        for round_data in bracket[bracket_type]['rounds']:
+            yield from round_data['matches']
+    if bracket.get('grand_final'):
+        yield from bracket['grand_final']['matches']
+
+def routing_target(rounds, round_index, match_index):
+    """Match and first slot that a pair of players from match_index moves into"""
+    if round_index < len(rounds):
+        matches = rounds[round_index]['matches']
+        if match_index // 2 < len(matches):
+            return matches[match_index // 2], (match_index % 2) * 2
+    return None, None
+
+def build_routing(bracket):
+    """
+    Map (bracket_type, round_index, match_index) of every double elimination
+    match to the matches and slots its winners and losers advance into
+    """
+    routing = {}
+    if not bracket or 'upper' not in bracket: return routing
+    upper_rounds = bracket['upper']['rounds']
+    lower_rounds = bracket['lower']['rounds']
+    grand_final_match = bracket['grand_final']['matches'][0]
+    for round_index, round_data in enumerate(upper_rounds):
+        lb_round_index = 0 if round_index == 0 else (round_index - 1) * 2 + 1
+        for match_index in range(len(round_data['matches'])):
+            if round_index + 1 >= len(upper_rounds):
+                winner_match, winner_slot = grand_final_match, 0
+            else:
+                winner_match, winner_slot = routing_target(upper_rounds, round_index + 1, match_index)
+            loser_match, loser_slot = routing_target(lower_rounds, lb_round_index, match_index)
+            routing[('upper', round_index, match_index)] = {"winner_match": winner_match, "winner_slot": winner_slot, "loser_match": loser_match, "loser_slot": loser_slot}
+    for round_index, round_data in enumerate(lower_rounds):
+        for match_index in range(len(round_data['matches'])):
+            if round_index + 1 >= len(lower_rounds):
+                winner_match, winner_slot = grand_final_match, 2
+            else:
+                winner_match, winner_slot = routing_target(lower_rounds, round_index + 1, match_index)
+            routing[('lower', round_index, match_index)] = {"winner_match": winner_match, "winner_slot": winner_slot, "loser_match": None, "loser_slot": None}
+    return routing
+
+def rebuild_bracket_cache():
+    bracket = db['main_tournament'].get('bracket')
+    bracket_cache["match_index"] = {m['id']: m for m in iter_bracket_matches(bracket)}
+    bracket_cache["routing"] = build_routing(bracket)
+
+rebuild_bracket_cache()
+
+def swiss_match_unchanged(players, scores):
+    """True when scores match what is stored and the players are already ranked and marked"""
+    if [p.get('score', 0) for p in players[:len(scores)]] != list(scores[:len(players)]):
+        return False
+    ranked = all(swiss_rank_key(a) >= swiss_rank_key(b) for a, b in zip(players, players[1:]))
+    return ranked and all(p.get('is_winner') == (i < 2) for i, p in enumerate(players))
 
 def advance_players(winners,losers,bracket_type,round_index,match_index):
-    grand_final_match=db["main_tournament"]["bracket"]["grand_final"]["matches"][0]
-    if bracket_type=='upper':
-        next_ub_round_index=round_index+1
-        if next_ub_round_index>=len(db["main_tournament"]["bracket"]["upper"]["rounds"]):
-            grand_final_match["players"][0]=winners[0]
-            grand_final_match["players"][1]=winners[1]
-        else:
-            next_match_index=match_index//2
-            start_slot=(match_index%2)*2
-            next_match=db["main_tournament"]["bracket"]["upper"]["rounds"][next_ub_round_index]["matches"][next_match_index]
-            next_match["players"][start_slot]=winners[0]
-            next_match["players"][start_slot+1]=winners[1]
-        if round_index==0:
-            lb_round_index=0
-        else:
-            lb_round_index=(round_index-1)*2+1
-        if lb_round_index<len(db["main_tournament"]["bracket"]["lower"]["rounds"]):
-            next_match_index=match_index//2
-            start_slot=(match_index%2)*2
-            next_match=db["main_tournament"]["bracket"]["lower"]["rounds"][lb_round_index]["matches"][next_match_index]
-            next_match["players"][start_slot]=losers[0]
-            next_match["players"][start_slot+1]=losers[1]
-    elif bracket_type=='lower':
-        next_lb_round_index=round_index+1
-        if next_lb_round_index>=len(db["main_tournament"]["bracket"]["lower"]["rounds"]):
-            grand_final_match["players"][2]=winners[0]
-            grand_final_match["players"][3]=winners[1]
-        else:
-            next_match_index=match_index//2
-            start_slot=(match_index%2)*2
-            if next_match_index<len(db["main_tournament"]["bracket"]["lower"]["rounds"][next_lb_round_index]["matches"]):
-                next_match=db["main_tournament"]["bracket"]["lower"]["rounds"][next_lb_round_index]["matches"][next_match_index]
-                next_match["players"][start_slot]=winners[0]
-                next_match["players"][start_slot+1]=winners[1]
-    
-    # Save the updated bracket state
-    save_config(CONFIG_FILE, db['main_tournament'])
+    route=bracket_cache["routing"].get((bracket_type,round_index,match_index))
+    if not route:return
+    for target_match,start_slot,advancing in((route["winner_match"],route["winner_slot"],winners),(route["loser_match"],route["loser_slot"],losers)):
+        if target_match is not None:
+            target_match["players"][start_slot]=advancing[0]
+            target_match["players"][start_slot+1]=advancing[1]
 
 # --- Main Routes ---
 @app.route('/')
@@ -507,41 +775,61 @@ def timer_view(): return render_template('timer.html')
 def seeding_graphic(): return render_template('seeding_graphic.html')
 
 # --- Main API Endpoints ---
+# (version, serialized body) of the last /api/status response
+_status_cache = {'main': (None, b'')}
+
 @app.route('/api/status', methods=['GET'])
-def get_status(): return jsonify(db['main_tournament'])
+def get_status():
+    get_db('main')
+    version, body = _status_cache['main']
+    if version != _versions['main']:
+        # Serialize under the lock so the body can't catch a mutation half-way,
+        # and read the version there so the ETag matches what was serialized
+        with DB_LOCK:
+            version = _versions['main']
+            body = orjson.dumps(db['main_tournament'], option=orjson.OPT_NON_STR_KEYS)
+            _status_cache['main'] = (version, body)
+    etag = f'"{version}"'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
 
 @app.route('/api/stop', methods=['POST'])
+@locks_db('main')
 def stop_tournament(): 
     db['main_tournament']['is_started'] = False
-    save_config(CONFIG_FILE, db['main_tournament'])
+    mark_dirty('main')
     return jsonify({"message": "Tournament stopped."})
 
 @app.route('/api/update_timer', methods=['POST'])
+@locks_db('main')
 def update_timer():
     data = request.get_json()
     for key in ['minutes', 'font', 'color', 'position']:
         if key in data: db['main_tournament']['timer'][key] = data[key]
-    save_config(CONFIG_FILE, db['main_tournament'])
+    mark_dirty('main')
     return jsonify(db['main_tournament']['timer'])
 
 @app.route('/api/update_info', methods=['POST'])
+@locks_db('main')
 def update_info():
     data = request.get_json()
     for key in ['tournament_name', 'featured_match', 'colors', 'logo_url', 'bracket_styles']:
         if key in data: db['main_tournament']['info'][key] = data[key]
-    save_config(CONFIG_FILE, db['main_tournament'])
+    mark_dirty('main')
     return jsonify(db['main_tournament']['info'])
 
 @app.route('/api/reset', methods=['POST'])
+@locks_db('main')
 def reset_tournament():
-    db['main_tournament'] = default_main_config
-    db['main_tournament']['is_started'] = False
-    db['main_tournament']['bracket'] = None
-    db['main_tournament']['players'] = []
-    save_config(CONFIG_FILE, db['main_tournament'])
+    db['main_tournament'] = copy.deepcopy(default_main_config)
+    rebuild_bracket_cache()
+    mark_dirty('main')
     return jsonify({"message": "Tournament reset successfully."})
 
 @app.route('/api/update_match', methods=['POST'])
+@locks_db('main')
 def update_match():
     data=request.get_json()
     bracket_type=data.get('bracket_type')
@@ -550,21 +838,20 @@ def update_match():
     config = db['main_tournament']['config']
 
     if bracket_type == 'swiss':
+        # The match index also holds double elimination matches, so check the format first
+        if db['main_tournament'].get('bracket_type') != 'swiss':
+            return jsonify({"error": "The current bracket is not a Swiss bracket."}), 400
         match_id = data.get('match_id')
-        match_to_update = next((m for m in bracket['matches'] if m['id'] == match_id), None)
-        if match_to_update:
+        match_to_update = bracket_cache["match_index"].get(match_id)
+        if match_to_update and not swiss_match_unchanged(match_to_update['players'], scores):
             for i, player in enumerate(match_to_update['players']):
                 if i < len(scores):
                     player['score'] = scores[i]
             
             # Recalculate winner status after updating scores
-            # Sort players by score, then by seed
-            match_to_update['players'].sort(key=lambda p: (p.get('score', 0), -p['seed']), reverse=True)
-            # Mark top 2 as winners
-            for i, player in enumerate(match_to_update['players']):
-                player['is_winner'] = (i < 2)
+            rank_swiss_match(match_to_update['players'])
             
-            save_config(CONFIG_FILE, db['main_tournament'])
+            mark_dirty('main')
         return jsonify(db['main_tournament'])
 
     round_index=data.get('round_index')
@@ -572,29 +859,36 @@ def update_match():
     try:
         if bracket_type=='grand_final':match=bracket["grand_final"]["matches"][match_index];points_needed=config["points_for_finals"]
         else:match=bracket[bracket_type]["rounds"][round_index]["matches"][match_index];points_needed=config["points_to_advance"]
-        for i,player in enumerate(match["players"]):
-            if i<len(scores):player["score"]=int(scores[i])
-        players_with_scores=[p for p in match["players"]if p.get('trackmania_id')not in[None,"TBD","BYE"]];players_with_scores.sort(key=lambda p:p.get('score',0),reverse=True)
-        qualified_players=[p for p in players_with_scores if p.get('score',0)>=points_needed]
-        if len(qualified_players)>=2:
-            winners=qualified_players[:2];match["winners"]=winners;match["is_complete"]=True
+        new_scores=[int(s)for s in scores[:len(match["players"])]]
+        scores_unchanged=new_scores==[p.get('score',0)for p in match["players"][:len(new_scores)]]
+        for player,score in zip(match["players"],new_scores):player["score"]=score
+        top_two=heapq.nlargest(2,(p for p in match["players"]if p.get('trackmania_id')not in PLACEHOLDER_IDS),key=SCORE_KEY)
+        winners=[p for p in top_two if p["score"]>=points_needed]
+        # A re-submit of the stored scores with the same outcome needs no advance or save
+        if scores_unchanged and match["is_complete"]==(len(winners)>=2) and (not match["is_complete"] or match["winners"]==winners):
+            return jsonify(db['main_tournament'])
+        if len(winners)>=2:
+            # Only record the result once the advance went through, so a failed advance
+            # is retried (and reported again) on re-submit instead of looking like a no-op
             if bracket_type!='grand_final':
-                all_player_ids=[p['trackmania_id']for p in match['players']];winner_ids=[p['trackmania_id']for p in winners];loser_ids=[id for id in all_player_ids if id not in winner_ids and id not in["TBD","BYE"]];losers=[p for p in match['players']if p['trackmania_id']in loser_ids]
+                winner_ids={p['trackmania_id']for p in winners};losers=[p for p in match['players']if p['trackmania_id']not in winner_ids and p['trackmania_id']not in PLACEHOLDER_IDS]
                 advancing_winners=[{"trackmania_id":w["trackmania_id"],"trackmania_name":w["trackmania_name"],"display_bracket_name":w["display_bracket_name"],"seed":w["seed"],"score":0}for w in winners];advancing_losers=[{"trackmania_id":l["trackmania_id"],"trackmania_name":l["trackmania_name"],"display_bracket_name":l["display_bracket_name"],"seed":l["seed"],"score":0}for l in losers]
                 advance_players(advancing_winners,advancing_losers,bracket_type,round_index,match_index)
+            match["winners"]=winners;match["is_complete"]=True
         else:match["winners"]=[];match["is_complete"]=False
-        save_config(CONFIG_FILE, db['main_tournament'])
+        mark_dirty('main')
     except(IndexError,TypeError,KeyError)as e:return jsonify({"error":f"Invalid data provided: {e}"}),400
     return jsonify(db['main_tournament'])
 
 @app.route('/api/config', methods=['POST'])
+@locks_db('main')
 def update_config():
     data=request.get_json()
     points=data.get('points_to_advance')
     final_points=data.get('points_for_finals')
     if points is not None:db["main_tournament"]["config"]["points_to_advance"]=int(points)
     if final_points is not None:db["main_tournament"]["config"]["points_for_finals"]=int(final_points)
-    save_config(CONFIG_FILE, db['main_tournament'])
+    mark_dirty('main')
     return jsonify(db["main_tournament"]["config"])
 
 @app.route('/api/start', methods=['POST'])
@@ -602,32 +896,54 @@ def start_main_tournament():
     data=request.get_json();players=data.get('players',[])
     bracket_type = data.get('bracket_type', 'double_elimination')
     
-    main_db = db["main_tournament"]
     # If players are already in the new format, use them directly
     if players and isinstance(players[0], dict) and 'trackmania_id' in players[0]:
-        main_db["players"] = players
+        pass
+    elif data.get('resolve_players'):
+        # Plain names/IDs that should be looked up on Nadeo, seeded in list order;
+        # resolved before taking the db lock so lookups don't hold up other writes
+        players = resolve_nadeo_players(players)
+        for i, player in enumerate(players):
+            player['seed'] = i + 1
     else:
         # Fallback to old format for backward compatibility
-        main_db["players"] = [{"trackmania_id": f"temp-id-{i+1}", "trackmania_name": name, "display_bracket_name": name, "seed": i + 1} for i, name in enumerate(players)]
-    main_db["bracket_type"] = bracket_type
+        players = [{"trackmania_id": f"temp-id-{i+1}", "trackmania_name": name, "display_bracket_name": name, "seed": i + 1} for i, name in enumerate(players)]
 
+    # Build and validate the new bracket before touching the live state
+    bracket = None
     if bracket_type == "double_elimination":
-        main_db["bracket"] = generate_double_elim_bracket(main_db["players"])
+        bracket = generate_double_elim_bracket(players)
     elif bracket_type == "swiss":
-        if len(main_db["players"]) != 16:
+        if len(players) != 16:
             return jsonify({"error": "Swiss format requires exactly 16 players."}), 400
-        main_db["bracket"] = generate_swiss_bracket(main_db["players"])
+        bracket = generate_swiss_bracket(players)
+        if bracket is None:
+            return jsonify({"error": "Swiss format requires seeds 1 to 16, each used once."}), 400
 
-    main_db["is_started"] = True
-    save_config(CONFIG_FILE, main_db)
-    return jsonify(main_db)
+    get_db('main')
+    with DB_LOCK:
+        try:
+            main_db = db["main_tournament"]
+            main_db["players"] = players
+            main_db["bracket_type"] = bracket_type
+            if bracket_type in ("double_elimination", "swiss"):
+                main_db["bracket"] = bracket
+            main_db["is_started"] = True
+            rebuild_bracket_cache()
+            mark_dirty('main')
+            return jsonify(main_db)
+        finally:
+            bump_version('main')
 
 # --- Seeding API Endpoints ---
 @app.route('/api/seeding/status', methods=['GET'])
 def get_seeding_status():
-    return jsonify(db['seeding_tournament'])
+    seeding_db = get_db('seeding')
+    with DB_LOCK:
+        return jsonify(seeding_db)
 
 @app.route('/api/seeding/start', methods=['POST'])
+@locks_db('seeding')
 def start_seeding():
     data = request.get_json()
     players = data.get('players', [])
@@ -643,10 +959,11 @@ def start_seeding():
     seeding_db['groups']['groupA'] = players[:midpoint]
     seeding_db['groups']['groupB'] = players[midpoint:]
 
-    save_config(SEEDING_CONFIG_FILE, seeding_db)
+    mark_dirty('seeding')
     return jsonify(seeding_db)
 
 @app.route('/api/seeding/update_scores', methods=['POST'])
+@locks_db('seeding')
 def update_seeding_scores():
     data = request.get_json()
     player = data.get('player')
@@ -657,7 +974,7 @@ def update_seeding_scores():
     if player in seeding_db['scores'] and map_name in seeding_db['maps']:
         try:
             seeding_db['scores'][player][map_name] = int(score)
-            save_config(SEEDING_CONFIG_FILE, seeding_db)
+            mark_dirty('seeding')
             return jsonify({"success": True})
         except (ValueError):
             return jsonify({"error": "Invalid score"}), 400
@@ -665,20 +982,21 @@ def update_seeding_scores():
     return jsonify({"error": "Player or map not found"}), 404
 
 @app.route('/api/seeding/reset', methods=['POST'])
+@locks_db('seeding')
 def reset_seeding():
-    db['seeding_tournament'] = default_seeding_config
-    db['seeding_tournament']['is_started'] = False
-    save_config(SEEDING_CONFIG_FILE, db['seeding_tournament'])
+    db['seeding_tournament'] = copy.deepcopy(default_seeding_config)
+    mark_dirty('seeding')
     return jsonify({"message": "Seeding tournament reset."})
     
 @app.route('/api/seeding/update_config', methods=['POST'])
+@locks_db('seeding')
 def update_seeding_config():
     data = request.get_json()
     if 'players_to_advance' in data:
         db['seeding_tournament']['config']['players_to_advance'] = int(data['players_to_advance'])
     if 'colors' in data:
         db['seeding_tournament']['config']['colors'] = data['colors']
-    save_config(SEEDING_CONFIG_FILE, db['seeding_tournament'])
+    mark_dirty('seeding')
     return jsonify(db['seeding_tournament']['config'])
 
 # Trackmania API Integration Endpoints
@@ -694,12 +1012,7 @@ def search_trackmania_players():
         if not query or len(query) < 2:
             return jsonify({"error": "Search query must be at least 2 characters"}), 400
         
-        players = search_nadeo_players(query, limit=10)
-        return jsonify({
-            "success": True,
-            "players": players,
-            "query": query
-        })
+        return jsonify(search_nadeo_players(query, limit=10))
     except Exception as e:
         return jsonify({"error": f"Search failed: {str(e)}"}), 500
 
@@ -711,15 +1024,8 @@ def get_trackmania_player(username):
     try:
         player = get_nadeo_player_by_username(username)
         if player:
-            return jsonify({
-                "success": True,
-                "player": player
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "error": "Player not found"
-            }), 404
+            return jsonify(player)
+        return jsonify({"error": "Player not found"}), 404
     except Exception as e:
         return jsonify({"error": f"Failed to fetch player: {str(e)}"}), 500
 
@@ -733,15 +1039,18 @@ def get_trackmania_rankings():
         if limit > 200:  # Prevent abuse
             limit = 200
         
-        players = get_nadeo_player_rankings(limit)
-        return jsonify({
-            "success": True,
-            "players": players,
-            "count": len(players)
-        })
+        return jsonify(get_nadeo_player_rankings(limit))
     except Exception as e:
         return jsonify({"error": f"Failed to fetch rankings: {str(e)}"}), 500
 
+@app.route('/api/trackmania/cache_clear', methods=['POST'])
+def clear_trackmania_cache():
+    """
+    Drop cached Nadeo rankings, searches and player lookups
+    """
+    clear_nadeo_caches()
+    return jsonify({"message": "Trackmania lookup cache cleared."})
+
 @app.route('/api/trackmania/test', methods=['GET'])
 def test_trackmania_api():
     """
@@ -752,30 +1061,29 @@ def test_trackmania_api():
         test_url = f"{NADEO_API_BASE}/players/search"
         params = {"search": "test"}
         
-        # Get access token first
+        # Get access token first (cached, so this only hits Nadeo once per token lifetime)
         access_token = get_nadeo_access_token()
         if not access_token:
             return jsonify({
-                "success": False,
                 "error": "No Nadeo access token available. Please configure CLIENT_ID and CLIENT_SECRET.",
                 "api_working": False
             }), 500
         
-        headers = {**NADEO_HEADERS, 'Authorization': f'Bearer {access_token}'}
-        response = requests.get(test_url, params=params, headers=headers, timeout=10)
+        # Stream the body and read only the first chunk needed for the preview
+        with NADEO_SESSION.get(test_url, params=params, timeout=10, stream=True) as response:
+            status_code = response.status_code
+            preview = next(response.iter_content(chunk_size=200), b'').decode('utf-8', 'replace') if status_code == 200 else "API Error"
         
+        # Never echo the request headers back: they carry the bearer token
         return jsonify({
-            "success": True,
-            "status_code": response.status_code,
-            "api_working": response.status_code == 200,
-            "response_preview": response.text[:200] if response.status_code == 200 else "API Error",
-            "headers_sent": headers,
+            "status_code": status_code,
+            "api_working": status_code == 200,
+            "response_preview": preview,
             "api_base": NADEO_API_BASE,
             "has_access_token": bool(access_token)
         })
     except Exception as e:
         return jsonify({
-            "success": False,
             "error": str(e),
             "api_working": False
         }), 500
@@ -792,28 +1100,14 @@ def test_player_lookup(query):
         player = get_nadeo_player_by_username(query)
         
         # Determine if it was treated as ID or username
-        is_id_format = len(query) >= 20 and query.replace('-', '').isalnum()
+        is_id_format = is_nadeo_id(query)
         
         return jsonify({
-            "success": True,
-            "query": query,
             "treated_as": "ID" if is_id_format else "Username",
-            "result": player,
-            "debug_info": {
-                "query_length": len(query),
-                "is_alphanumeric_with_dashes": query.replace('-', '').isalnum(),
-                "is_id_format": is_id_format
-            }
+            "result": player
         })
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "debug_info": {
-                "query": query,
-                "query_length": len(query) if query else 0
-            }
-        }), 500
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/api/trackmania/auto-seed', methods=['POST'])
 def auto_seed_tournament():
@@ -837,176 +1131,36 @@ def auto_seed_tournament():
             # Just get players without auto-seeding
             players = get_nadeo_player_rankings(player_count)
         
-        return jsonify({
-            "success": True,
-            "players": players,
-            "count": len(players),
-            "auto_seeded": use_rankings
-        })
+        return jsonify(players)
     except Exception as e:
         return jsonify({"error": f"Auto-seeding failed: {str(e)}"}), 500
 
 @app.route('/api/advance_swiss_stage', methods=['POST'])
+@locks_db('main')
 def advance_swiss_stage():
     bracket = db["main_tournament"]['bracket']
     if not bracket or db["main_tournament"].get('bracket_type') != 'swiss':
         return jsonify({"error": "Invalid state for this action"}), 400
-    
-    bracket['history'][f"round_{bracket['round']}"] = copy.deepcopy(bracket['matches'])
-
-    if bracket['round'] == 1:
-        # Mark winners in current round before advancing
-        for match in bracket['matches']:
-            # Sort players by score, then by seed
-            match['players'].sort(key=lambda p: (p.get('score', 0), -p['seed']), reverse=True)
-            # Mark top 2 as winners
-            for i, player in enumerate(match['players']):
-                player['is_winner'] = (i < 2)
-        
-        all_players = []
-        for match in bracket['matches']:
-            all_players.extend(sorted(match['players'], key=lambda p: p.get('score', 0), reverse=True))
-        
-        top_8 = all_players[:8]
-        bottom_8 = all_players[8:]
-
-        # Create new matches and preserve winner status
-        new_matches = [
-            {"id": "SWISS-R2-M1", "name": "Top 8 - Match 1", "players": top_8[:4]},
-            {"id": "SWISS-R2-M2", "name": "Top 8 - Match 2", "players": top_8[4:]},
-            {"id": "SWISS-R2-M3", "name": "Bottom 8 - Match 1", "players": bottom_8[:4]},
-            {"id": "SWISS-R2-M4", "name": "Bottom 8 - Match 2", "players": bottom_8[4:]}
-        ]
-        
-        # Ensure all players have is_winner field (default to false for new matches)
-        for match in new_matches:
-            for player in match['players']:
-                if 'is_winner' not in player:
-                    player['is_winner'] = False
-        
-        bracket['matches'] = new_matches
-        bracket['round'] = 2
-
-    elif bracket['round'] == 2:
-        # Mark winners in current round before advancing
-        for match in bracket['matches']:
-            # Sort players by score, then by seed
-            match['players'].sort(key=lambda p: (p.get('score', 0), -p['seed']), reverse=True)
-            # Mark top 2 as winners
-            for i, player in enumerate(match['players']):
-                player['is_winner'] = (i < 2)
-        
-        # For round 2, use only the current round scores to determine seeding
-        all_players = []
-        for match in bracket['matches']:
-            all_players.extend(sorted(match['players'], key=lambda p: p.get('score', 0), reverse=True))
-        
-        # Sort by current round performance, then by seed
-        final_seeding = sorted(all_players, key=lambda p: (p.get('score', 0), -p['seed']), reverse=True)
-
-        bracket['stage'] = 'groups'
-        # Create new matches and preserve winner status
-        new_matches = [
-            {"id": "champion", "name": "Champion", "players": final_seeding[0:4]},
-            {"id": "gold", "name": "Gold", "players": final_seeding[4:8]},
-            {"id": "silver", "name": "Silver", "players": final_seeding[8:12]},
-            {"id": "bronze", "name": "Bronze", "players": final_seeding[12:16]}
-        ]
-        
-        # Ensure all players have is_winner field (default to false for new matches)
-        for match in new_matches:
-            for player in match['players']:
-                if 'is_winner' not in player:
-                    player['is_winner'] = False
-        
-        bracket['matches'] = new_matches
-        bracket['round'] = 3
-    
-    elif bracket['round'] in [3, 4]:
-        groups = {g['id']: g for g in bracket['matches']}
-        
-        # For each group, determine winners based on current round performance only
-        for group in groups.values():
-            # Sort players by current round score first, then by seed (higher seed = lower number = higher priority)
-            group['players'].sort(key=lambda p: (
-                p.get('score', 0),  # Current round score (highest first)
-                -p['seed']  # Seed (higher seed = lower number = higher priority)
-            ), reverse=True)
-            
-            # Mark top 2 players as winners for this round
-            for i, player in enumerate(group['players']):
-                player['is_winner'] = (i < 2)
-
-        # For round 3 specifically, ensure gold match prioritizes higher seeds when scores are tied
-        if bracket['round'] == 3:
-            # Sort champion group bottom 2 and silver group top 2 by seed when creating gold match
-            champion_bottom = sorted(groups['champion']['players'][2:], key=lambda p: p['seed'])
-            silver_top = sorted(groups['silver']['players'][:2], key=lambda p: p['seed'])
-            new_gold = champion_bottom + silver_top
-        else:
-            new_gold = groups['champion']['players'][2:] + groups['silver']['players'][:2]
-
-        new_champion = groups['champion']['players'][:2] + groups['gold']['players'][:2]
-        new_silver = groups['silver']['players'][2:] + groups['bronze']['players'][:2]
-        new_bronze = groups['bronze']['players'][2:]
-
-        # Create new matches and ensure all players have is_winner field
-        new_matches = [
-            {"id": "champion", "name": "Champion", "players": new_champion},
-            {"id": "gold", "name": "Gold", "players": new_gold},
-            {"id": "silver", "name": "Silver", "players": new_silver},
-            {"id": "bronze", "name": "Bronze", "players": new_bronze}
-        ]
-        
-        # Ensure all players have is_winner field (default to false for new matches)
-        for match in new_matches:
-            for player in match['players']:
-                if 'is_winner' not in player:
-                    player['is_winner'] = False
-        
-        bracket['matches'] = new_matches
-        bracket['round'] += 1
-
-    # Reset scores for new round
-    for match in bracket['matches']:
-        for player in match['players']: 
-            player['score'] = 0
 
-    save_config(CONFIG_FILE, db['main_tournament'])
+    advance_round(bracket)
+    rebuild_bracket_cache()
+    mark_dirty('main')
     return jsonify(db['main_tournament'])
 
 @app.route('/api/go_back_swiss', methods=['POST'])
+@locks_db('main')
 def go_back_swiss():
     bracket = db["main_tournament"]['bracket']
     if not bracket or db["main_tournament"].get('bracket_type') != 'swiss':
         return jsonify({"error": "Invalid state for this action"}), 400
-    
-    if bracket['round'] <= 1:
-        return jsonify({"error": "Cannot go back from round 1"}), 400
-    
-    # Get the previous round from history
-    prev_round_key = f"round_{bracket['round'] - 1}"
-    if prev_round_key not in bracket['history']:
-        return jsonify({"error": "Previous round data not found"}), 400
-    
-    # Restore the previous round
-    bracket['matches'] = copy.deepcopy(bracket['history'][prev_round_key])
-    bracket['round'] -= 1
-    
-    # Remove the current round from history since we're going back
-    current_round_key = f"round_{bracket['round']}"
-    if current_round_key in bracket['history']:
-        del bracket['history'][current_round_key]
-    
-    # Reset scores for the restored round and ensure is_winner field exists
-    for match in bracket['matches']:
-        for player in match['players']: 
-            player['score'] = 0
-            if 'is_winner' not in player:
-                player['is_winner'] = False
-    
-    save_config(CONFIG_FILE, db['main_tournament'])
+
+    error = go_back_round(bracket)
+    if error:
+        return jsonify({"error": error}), 400
+
+    rebuild_bracket_cache()
+    mark_dirty('main')
     return jsonify(db['main_tournament'])
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    app.run(debug=True, port=5000, threaded=True)
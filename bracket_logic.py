@@ -0,0 +1,142 @@
+# bracket_logic.py
+# Swiss stage transitions, kept free of Flask and I/O so they work on the plain
+# bracket dicts from config.json. Fully annotated so the module can be compiled
+# with mypyc (`mypyc bracket_logic.py`); app.py imports it either way.
+# Players stay as dicts because the bracket is the JSON document that is saved
+# and served as-is; list.sort computes each key once per player, so a 16-player
+# round never does per-comparison dict lookups.
+
+import operator
+from typing import Any, Dict, List, Optional
+
+Player = Dict[str, Any]
+Match = Dict[str, Any]
+Bracket = Dict[str, Any]
+
+SEED_KEY = operator.itemgetter('seed')
+
+def swiss_rank_key(p: Player) -> tuple:
+    """Swiss standings order: score first, then the better (lower) seed"""
+    return (p['score'], -p['seed'])
+
+def rank_swiss_match(players: List[Player]) -> None:
+    """Sort a Swiss match into standings order and mark its top 2 as winners"""
+    players.sort(key=swiss_rank_key, reverse=True)
+    # Not always 4 players: the bronze group keeps only 2 from round 4 on
+    for player in players[:2]:
+        player['is_winner'] = True
+    for player in players[2:]:
+        player['is_winner'] = False
+
+def compact_swiss_round(matches: List[Match]) -> List[Dict[str, Any]]:
+    """Round history entry: each match's [seed, score] pairs in standings order and its winning seeds"""
+    return [{**{k: v for k, v in m.items() if k != "players"},
+             "scores": [[p["seed"], p["score"]] for p in m["players"]],
+             "winners": [p["seed"] for p in m["players"] if p["is_winner"]]} for m in matches]
+
+def expand_swiss_round(bracket: Bracket, history_round: List[Dict[str, Any]]) -> List[Match]:
+    """Rebuild full Swiss matches from a compact_swiss_round entry"""
+    players_by_seed = bracket["players_by_seed"]
+    return [{**{k: v for k, v in m.items() if k not in ("scores", "winners")},
+             "players": [{**players_by_seed[str(seed)], "score": score, "is_winner": seed in m["winners"]} for seed, score in m["scores"]]}
+            for m in history_round]
+
+def reset_scores(matches: List[Match]) -> None:
+    for match in matches:
+        for player in match['players']:
+            player['score'] = 0
+
+def advance_round(bracket: Bracket) -> None:
+    """Record the current round in history and move every player into next round's matches"""
+    bracket['history'][f"round_{bracket['round']}"] = compact_swiss_round(bracket['matches'])
+
+    if bracket['round'] == 1:
+        # Mark winners in current round before advancing
+        for match in bracket['matches']:
+            rank_swiss_match(match['players'])
+
+        # Each match is already in standings order after the sort above
+        all_players = [p for match in bracket['matches'] for p in match['players']]
+
+        top_8 = all_players[:8]
+        bottom_8 = all_players[8:]
+
+        # Create new matches and preserve winner status
+        bracket['matches'] = [
+            {"id": "SWISS-R2-M1", "name": "Top 8 - Match 1", "players": top_8[:4]},
+            {"id": "SWISS-R2-M2", "name": "Top 8 - Match 2", "players": top_8[4:]},
+            {"id": "SWISS-R2-M3", "name": "Bottom 8 - Match 1", "players": bottom_8[:4]},
+            {"id": "SWISS-R2-M4", "name": "Bottom 8 - Match 2", "players": bottom_8[4:]}
+        ]
+        bracket['round'] = 2
+
+    elif bracket['round'] == 2:
+        # Mark winners in current round before advancing
+        for match in bracket['matches']:
+            rank_swiss_match(match['players'])
+
+        # For round 2, use only the current round scores to determine seeding
+        all_players = [p for match in bracket['matches'] for p in match['players']]
+
+        # Sort by current round performance, then by seed
+        final_seeding = sorted(all_players, key=swiss_rank_key, reverse=True)
+
+        bracket['stage'] = 'groups'
+        # Create new matches and preserve winner status
+        bracket['matches'] = [
+            {"id": "champion", "name": "Champion", "players": final_seeding[0:4]},
+            {"id": "gold", "name": "Gold", "players": final_seeding[4:8]},
+            {"id": "silver", "name": "Silver", "players": final_seeding[8:12]},
+            {"id": "bronze", "name": "Bronze", "players": final_seeding[12:16]}
+        ]
+        bracket['round'] = 3
+
+    elif bracket['round'] in [3, 4]:
+        groups = {g['id']: g for g in bracket['matches']}
+
+        # For each group, determine winners based on current round performance only
+        for group in groups.values():
+            # Current round score first, then seed (higher seed = lower number = higher priority)
+            rank_swiss_match(group['players'])
+
+        # For round 3 specifically, ensure gold match prioritizes higher seeds when scores are tied
+        if bracket['round'] == 3:
+            # Sort champion group bottom 2 and silver group top 2 by seed when creating gold match
+            champion_bottom = sorted(groups['champion']['players'][2:], key=SEED_KEY)
+            silver_top = sorted(groups['silver']['players'][:2], key=SEED_KEY)
+            new_gold = champion_bottom + silver_top
+        else:
+            new_gold = groups['champion']['players'][2:] + groups['silver']['players'][:2]
+
+        new_champion = groups['champion']['players'][:2] + groups['gold']['players'][:2]
+        new_silver = groups['silver']['players'][2:] + groups['bronze']['players'][:2]
+        new_bronze = groups['bronze']['players'][2:]
+
+        bracket['matches'] = [
+            {"id": "champion", "name": "Champion", "players": new_champion},
+            {"id": "gold", "name": "Gold", "players": new_gold},
+            {"id": "silver", "name": "Silver", "players": new_silver},
+            {"id": "bronze", "name": "Bronze", "players": new_bronze}
+        ]
+        bracket['round'] += 1
+
+    # Reset scores for new round
+    reset_scores(bracket['matches'])
+
+def go_back_round(bracket: Bracket) -> Optional[str]:
+    """Restore the previous round from history; returns an error message if there is none"""
+    if bracket['round'] <= 1:
+        return "Cannot go back from round 1"
+
+    # Get the previous round from history
+    prev_round_key = f"round_{bracket['round'] - 1}"
+    if prev_round_key not in bracket['history']:
+        return "Previous round data not found"
+
+    # Restore the previous round, then drop it from history since it is current again
+    bracket['matches'] = expand_swiss_round(bracket, bracket['history'].pop(prev_round_key))
+    bracket['round'] -= 1
+
+    # Reset scores for the restored round
+    reset_scores(bracket['matches'])
+    return None
@@ -6,7 +6,9 @@ from app import app # Imports your existing Flask app
 def start_flask():
     """Starts the Flask server in a separate thread."""
     # Use host='127.0.0.1' to ensure it's only accessible locally
-    app.run(host='127.0.0.1', port=5000)
+    # threaded=True gives every request its own thread, so a slow Nadeo call
+    # never holds up the overlay pages polling /api/status
+    app.run(host='127.0.0.1', port=5000, threaded=True)
 
 if __name__ == '__main__':
     # Start the Flask server in the background
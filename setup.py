@@ -6,7 +6,24 @@ This script helps users quickly configure the tournament software
 
 import os
 import shutil
-import json
+import orjson
+
+def patch_json(path, updates):
+    """
+    Set {"dotted.key": value} pairs in a JSON file, keeping every other key as it is
+    Missing parent objects are created
+    """
+    with open(path, 'rb') as f:
+        data = orjson.loads(f.read())
+    for dotted_key, value in updates.items():
+        *parents, key = dotted_key.split('.')
+        target = data
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[key] = value
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(f"{path}.tmp", path)
 
 def main():
     print("🎮 Serotonin Tournament Software Setup")
@@ -45,12 +62,7 @@ def main():
     # Update config.json with tournament name
     if os.path.exists('config.json'):
         try:
-            with open('config.json', 'r') as f:
-                config = json.load(f)
-            config['info']['tournament_name'] = tournament_name
-            
-            with open('config.json', 'w') as f:
-                json.dump(config, f, indent=4)
+            patch_json('config.json', {'info.tournament_name': tournament_name})
             print(f"✅ Set tournament name to: {tournament_name}")
         except Exception as e:
             print(f"⚠️  Could not update tournament name: {e}")
@@ -67,13 +79,10 @@ def main():
     if client_id and client_secret:
         if os.path.exists('nadeo_config.json'):
             try:
-                with open('nadeo_config.json', 'r') as f:
-                    nadeo_config = json.load(f)
-                nadeo_config['nadeo_client_id'] = client_id
-                nadeo_config['nadeo_client_secret'] = client_secret
-                
-                with open('nadeo_config.json', 'w') as f:
-                    json.dump(nadeo_config, f, indent=4)
+                patch_json('nadeo_config.json', {
+                    'nadeo_client_id': client_id,
+                    'nadeo_client_secret': client_secret
+                })
                 print("✅ Nadeo API credentials configured")
             except Exception as e:
                 print(f"⚠️  Could not update Nadeo config: {e}")